@@ -3,11 +3,14 @@ import sys
 import argparse
 import csv
 import json
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
+from google.genai import errors
 import pandas as pd
 from tqdm import tqdm
 from pydantic import BaseModel, Field
@@ -23,6 +26,12 @@ MD_GOV_URL = "https://www.maryland.gov/your-government/state-agencies-and-depart
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
+# Number of agency summaries requested from Gemini at once
+AGENCY_CONCURRENCY = 8
+# Completed agencies between incremental CSV saves
+SAVE_EVERY = 32
+# Attempts per agency when Gemini rate-limits (429) or errors server-side
+MAX_RETRIES = 5
 
 def scrape_agencies():
     """Scrapes Maryland.gov for agency names and URLs."""
@@ -30,21 +39,20 @@ def scrape_agencies():
     try:
         response = requests.get(MD_GOV_URL, headers=HEADERS, timeout=15)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(response.content, 'lxml')
         
         # Target the specific container div.usa-prose
         container = soup.select_one('div.usa-prose')
         agencies = []
         
         if container:
-            links = container.find_all('a', href=True)
-            for link in links:
+            # Only absolute links are agency sites; the selector filters them during traversal
+            for link in container.select('a[href^="http"]'):
                 name = link.get_text(strip=True)
-                url = link['href']
                 
                 # Filter out obvious noise
-                if url.startswith('http') and len(name) > 3:
-                    agencies.append({"name": name, "url": url})
+                if len(name) > 3:
+                    agencies.append({"name": name, "url": link['href']})
         
         print(f"Found {len(agencies)} total entities.")
         return agencies
@@ -61,6 +69,7 @@ class AgencyMetadata(BaseModel):
 def get_agency_summary(client, agency_name):
     """
     Uses Gemini with Google Search grounding to summarize the agency and extract metadata.
+    Returns None if the call fails, so the agency is left blank and retried on the next run.
     """
     prompt = f"""
     Search for the Maryland state agency named "{agency_name}". 
@@ -78,23 +87,33 @@ def get_agency_summary(client, agency_name):
         response_schema=AgencyMetadata
     )
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=prompt,
-            config=config
-        )
-        # Parse the JSON response
+    for attempt in range(MAX_RETRIES):
         try:
-            return json.loads(response.text)
-        except json.JSONDecodeError:
-            # Fallback if valid JSON isn't returned
-            print(f"Warning: Could not parse JSON for {agency_name}")
-            return {"summary": response.text.strip(), "acronym": "", "aliases": ""}
-            
-    except Exception as e:
-        print(f"Error generating summary for {agency_name}: {e}")
-        return {"summary": f"Error: {e}", "acronym": "", "aliases": ""}
+            response = client.models.generate_content(
+                model="gemini-3-flash-preview",
+                contents=prompt,
+                config=config
+            )
+            # Parse the JSON response
+            try:
+                return json.loads(response.text)
+            except json.JSONDecodeError:
+                # Fallback if valid JSON isn't returned
+                tqdm.write(f"Warning: Could not parse JSON for {agency_name}")
+                return {"summary": response.text.strip(), "acronym": "", "aliases": ""}
+
+        except (errors.ClientError, errors.ServerError) as e:
+            # Concurrent grounded searches can hit the rate limit; back off and try again
+            retryable = isinstance(e, errors.ServerError) or e.code == 429
+            if retryable and attempt < MAX_RETRIES - 1:
+                time.sleep(2 ** attempt)
+                continue
+            tqdm.write(f"Error generating summary for {agency_name}: {e}")
+            return None
+        except Exception as e:
+            tqdm.write(f"Error generating summary for {agency_name}: {e}")
+            return None
+    return None
 
 def main():
     # 1. Setup Arguments & Check API Key
@@ -194,23 +213,45 @@ def main():
         client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
         count = 0
-        for idx in tqdm(to_process_indices):
-            name = df.at[idx, 'Agency Name']
-            
-            # Using tqdm.write prevents the progress bar from breaking visually when printing
-            tqdm.write(f"Processing: {name}...")
+        # Each summary is a slow grounded search call, so run several at once.
+        # Results are applied (and saved) from this thread only.
+        try:
+            with ThreadPoolExecutor(max_workers=AGENCY_CONCURRENCY) as executor:
+                futures = {
+                    executor.submit(get_agency_summary, client, df.at[idx, 'Agency Name']): idx
+                    for idx in to_process_indices
+                }
+                try:
+                    for future in tqdm(as_completed(futures), total=len(futures)):
+                        idx = futures[future]
+                        name = df.at[idx, 'Agency Name']
+
+                        # Using tqdm.write prevents the progress bar from breaking visually when printing
+                        tqdm.write(f"Processed: {name}")
 
-            # Generate Summary and Metadata
-            metadata = get_agency_summary(client, name)
+                        # Generate Summary and Metadata
+                        metadata = future.result()
+                        if metadata is None:
+                            # Leave the row blank so the next run picks it up again
+                            continue
 
-            # Update DataFrame
-            df.at[idx, 'Summary'] = metadata.get('summary', '')
-            df.at[idx, 'Acronym'] = metadata.get('acronym', '')
-            df.at[idx, 'Alias'] = metadata.get('aliases', '')
+                        # Update DataFrame
+                        df.at[idx, 'Summary'] = metadata.get('summary', '')
+                        df.at[idx, 'Acronym'] = metadata.get('acronym', '')
+                        df.at[idx, 'Alias'] = metadata.get('aliases', '')
+                        count += 1
 
-            # Save incrementally (in case of crash)
+                        # Save periodically (in case of crash) rather than rewriting the CSV per agency
+                        if count % SAVE_EVERY == 0:
+                            df.to_csv(output_file, index=False)
+                except KeyboardInterrupt:
+                    # Don't wait for queued agencies on Ctrl+C; only in-flight calls finish
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            # Persist everything completed since the last periodic save
             df.to_csv(output_file, index=False)
-            count += 1
 
         print(f"Finished processing {count} agencies.")
     else:
@@ -3,20 +3,139 @@
 import os
 import json
 import time
+import hashlib
+import functools
+import sqlite3
+import threading
+from contextlib import closing
+from tqdm import tqdm
 import tiktoken
-from openai import OpenAI, OpenAIError
+from openai import OpenAI, OpenAIError, LengthFinishReasonError
 import google
 from google import genai
-from google.genai.types import GenerateContentConfig
+from google.genai.types import GenerateContentConfig, CreateCachedContentConfig, FinishReason
 import ollama
 from ollama import chat
 from ollama import ChatResponse
 
-def query_llm_with_retries(client, prompt, value, response_format, model_name, max_retries=5, model_family='gemini'):
+class OutputTruncatedError(Exception):
+    """The response stopped at the output-token limit; asking again would hit the same limit."""
+
+RESPONSE_CACHE_PATH = os.path.join('data', '.llm_cache', 'responses.sqlite')
+
+class ResponseCache:
+    """Exact-match cache of LLM responses, persisted to SQLite so re-runs skip identical calls."""
+
+    def __init__(self, path):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT)")
+            self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, model, response):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response) VALUES (?, ?, ?)",
+                (key, model, json.dumps(response))
+            )
+
+response_cache = ResponseCache(RESPONSE_CACHE_PATH)
+
+def response_cache_key(model_family, model_name, prompt, value, response_format):
+    """SHA-256 over everything that determines the response."""
+    if hasattr(response_format, 'model_json_schema'):
+        schema = json.dumps(response_format.model_json_schema(), sort_keys=True)
+    else:
+        schema = json.dumps(response_format, sort_keys=True)
+    payload = "\0".join([model_family, model_name, prompt, value, schema])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Gemini only accepts explicit caches above a minimum token count, so small prompts are sent inline
+PROMPT_CACHE_MIN_CHARS = 16000
+PROMPT_CACHE_TTL_SECONDS = 3600
+
+_prompt_caches = {}
+_prompt_cache_lock = threading.Lock()
+
+def get_gemini_prompt_cache(client, model_name, prompt):
+    """
+    Returns the name of a Gemini CachedContent holding `prompt` as its system instruction,
+    creating (or refreshing) it on first use. Returns None when the prompt is too small or caching fails.
+    """
+    if len(prompt) < PROMPT_CACHE_MIN_CHARS:
+        return None
+
+    key = (model_name, prompt)
+    with _prompt_cache_lock:
+        entry = _prompt_caches.get(key)
+        # Refresh a minute early so in-flight requests don't reference an expired cache
+        if entry and entry[1] > time.time() + 60:
+            return entry[0]
+
+        expires_at = time.time() + PROMPT_CACHE_TTL_SECONDS
+        try:
+            cached = client.caches.create(
+                model=model_name,
+                config=CreateCachedContentConfig(
+                    system_instruction=prompt,
+                    ttl=f"{PROMPT_CACHE_TTL_SECONDS}s",
+                ),
+            )
+            name = cached.name
+        except Exception as e:
+            # Remember the failure so every call doesn't retry cache creation
+            tqdm.write(f"Prompt caching unavailable, sending prompt inline: {e}")
+            name = None
+        _prompt_caches[key] = (name, expires_at)
+        return name
+
+@functools.lru_cache(maxsize=32)
+def _gemini_config(system_instruction, cached_content, response_format, max_output_tokens):
+    """Builds the GenerateContentConfig once per prompt/schema combination and reuses it across calls."""
+    config_args = {}
+    if cached_content:
+        config_args['cached_content'] = cached_content
+    else:
+        config_args['system_instruction'] = system_instruction
+    if max_output_tokens:
+        config_args['max_output_tokens'] = max_output_tokens
+    if response_format:
+        config_args['response_mime_type'] = 'application/json'
+        config_args['response_schema'] = response_format
+    return GenerateContentConfig(**config_args)
+
+def query_llm_with_retries(client, prompt, value, response_format, model_name, max_retries=5, model_family='gemini', max_output_tokens=None, use_cache=True):
     """
     Query Gemini, OpenAI (GPT), or Ollama LLM with retries and error handling. Returns parsed JSON or text.
     model_family: 'gemini', 'gpt', or 'ollama'
+    max_output_tokens: optional cap on generated tokens (None leaves the provider default)
+    use_cache: serve repeated (model, prompt, value, format) calls from the on-disk response cache.
+               With False the cache is bypassed, but a fresh result still replaces the stored one.
     """
+    key = response_cache_key(model_family, model_name, prompt, value, response_format)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = _query_llm(client, prompt, value, response_format, model_name, max_retries, model_family, max_output_tokens)
+
+    if result is not None:
+        response_cache.set(key, model_name, result)
+    return result
+
+def _query_llm(client, prompt, value, response_format, model_name, max_retries, model_family, max_output_tokens):
     for attempt in range(max_retries):
         try:
             if model_family == 'ollama':
@@ -29,10 +148,16 @@ def query_llm_with_retries(client, prompt, value, response_format, model_name, m
                     'messages': formattedPromptContents,
                     'options': {'temperature': 0.2}
                 }
+                if max_output_tokens:
+                    kwargs['options']['num_predict'] = max_output_tokens
                 if response_format:
+                    # Schema-constrained decoding (Ollama >= 0.5) can't produce invalid JSON, so decode greedily
                     kwargs['format'] = response_format.model_json_schema() if hasattr(response_format, 'model_json_schema') else response_format
+                    kwargs['options']['temperature'] = 0.0
 
                 response = client(**kwargs)
+                if response.done_reason == 'length':
+                    raise OutputTruncatedError(model_name)
                 
                 if response_format:
                     parsed_response_content = json.loads(response.message.content)
@@ -41,18 +166,17 @@ def query_llm_with_retries(client, prompt, value, response_format, model_name, m
                     return response.message.content
 
             elif model_family == 'gemini':
-                config_args = {
-                    'system_instruction': prompt,
-                }
-                if response_format:
-                    config_args['response_mime_type'] = 'application/json'
-                    config_args['response_schema'] = response_format
+                # Large shared prompts are sent once as a server-side cache and referenced by handle
+                cached_content = get_gemini_prompt_cache(client, model_name, prompt)
+                system_instruction = None if cached_content else prompt
                 
                 response = client.models.generate_content(
                     model=model_name,
                     contents=value,
-                    config=GenerateContentConfig(**config_args),
+                    config=_gemini_config(system_instruction, cached_content, response_format, max_output_tokens),
                 )
+                if response.candidates and response.candidates[0].finish_reason == FinishReason.MAX_TOKENS:
+                    raise OutputTruncatedError(model_name)
                 
                 if response_format:
                     return json.loads(response.text)
@@ -64,49 +188,64 @@ def query_llm_with_retries(client, prompt, value, response_format, model_name, m
                     {'role': 'system', 'content': prompt},
                     {'role': 'user', 'content': value},
                 ]
+                extra_args = {}
+                if max_output_tokens:
+                    extra_args['max_completion_tokens'] = max_output_tokens
                 
                 if response_format:
                     response = client.beta.chat.completions.parse(
                         model=model_name,
                         messages=messages,
-                        response_format=response_format
+                        response_format=response_format,
+                        **extra_args
                     )
                     return response.choices[0].message.parsed.model_dump()
                 else:
                     response = client.chat.completions.create(
                         model=model_name,
-                        messages=messages
+                        messages=messages,
+                        **extra_args
                     )
+                    if response.choices[0].finish_reason == 'length':
+                        raise OutputTruncatedError(model_name)
                     return response.choices[0].message.content
 
             else:
                 raise ValueError(f"Unknown model_family: {model_family}")
+        except (OutputTruncatedError, LengthFinishReasonError):
+            # Checked before OpenAIError, which LengthFinishReasonError subclasses
+            tqdm.write("Response truncated at the output token limit. Not retrying. Returning None.")
+            return None
         except (google.genai.errors.ServerError, OpenAIError) as e:
-            print(f"Connection error: {e}")
+            tqdm.write(f"Connection error: {e}")
             if attempt < max_retries - 1:
                 sleep_duration = (2 ** attempt) * 1
-                print(f"Retrying in {sleep_duration} seconds...")
+                tqdm.write(f"Retrying in {sleep_duration} seconds...")
                 time.sleep(sleep_duration)
             else:
-                print("Max retries reached. Returning None.")
+                tqdm.write("Max retries reached. Returning None.")
                 return None
         except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
+            tqdm.write(f"JSON decode error: {e}")
+            if model_family == 'ollama':
+                # Output was schema-constrained (usually truncated by num_predict); a regeneration won't differ
+                tqdm.write("Not retrying constrained Ollama output. Returning None.")
+                return None
             if attempt < max_retries - 1:
                 sleep_duration = (2 ** attempt) * 1
-                print(f"Retrying in {sleep_duration} seconds...")
+                tqdm.write(f"Retrying in {sleep_duration} seconds...")
                 time.sleep(sleep_duration)
             else:
-                print("Max retries reached. Returning None.")
+                tqdm.write("Max retries reached. Returning None.")
                 return None
         except Exception as e:
             # For Ollama or any other unexpected error
-            print(f"Unexpected error: {e}")
+            tqdm.write(f"Unexpected error: {e}")
             if attempt < max_retries - 1:
                 sleep_duration = (2 ** attempt) * 1
-                print(f"Retrying in {sleep_duration} seconds...")
+                tqdm.write(f"Retrying in {sleep_duration} seconds...")
                 time.sleep(sleep_duration)
             else:
-                print("Max retries reached. Returning None.")
+                tqdm.write("Max retries reached. Returning None.")
                 return None
     return None
@@ -1,7 +1,9 @@
 import os
+import re
 import hashlib
 from google import genai
 from glob import glob
+from tqdm import tqdm
 from llm_utils import query_llm_with_retries
 
 SYSTEM_PROMPT = (
@@ -16,21 +18,30 @@ USER_TEMPLATE = (
     "<amendment>\n{}\n</amendment>"
 )
 
-def apply_amendments(session_year: int, bill_number: str, state_manager, client, model_name: str, model_family: str):
+# Page delimiters added by convert.pdf_text; they carry no amendment content
+PAGE_MARKER_PATTERN = re.compile(r'^(?:START|END) OF PAGE \d+$', re.MULTILINE)
+
+# Below this many characters of actual text an amendment cannot contain an instruction
+MIN_AMENDMENT_CHARS = 40
+
+def _has_content(md, min_chars=1):
+    return len(PAGE_MARKER_PATTERN.sub('', md).strip()) >= min_chars
+
+def apply_amendments(session_year: int, bill_number: str, state_manager, client, model_name: str, model_family: str, use_cache: bool = True) -> dict:
+    """Applies the bill's adopted amendments to its markdown. Returns the bill's updated state."""
     md_dir = os.path.abspath(f'data/{session_year}rs/md')
     bill_path = os.path.join(md_dir, f"{bill_number}.md")
     
     if not os.path.exists(bill_path):
-        print(f"Skipping amend for {bill_number}: Main MD not found.")
-        return
+        tqdm.write(f"Skipping amend for {bill_number}: Main MD not found.")
+        return state_manager.get_bill(bill_number)
 
     # Find amendment MD files
     amd_pattern = os.path.join(md_dir, f"{bill_number}_amd*.md")
     amd_files = glob(amd_pattern)
     
     if not amd_files:
-        state_manager.update_bill(bill_number, {"needs_amend": False, "amended_status": "original"})
-        return
+        return state_manager.update_bill(bill_number, {"needs_amend": False, "amended_status": "original"})
 
     # Sort amendments (logic might differ, but alphabetical usually works for id)
     amd_files.sort()
@@ -41,27 +52,39 @@ def apply_amendments(session_year: int, bill_number: str, state_manager, client,
         bill_content = f.read()
         hasher.update(bill_content.encode('utf-8'))
     
+    # Keep the amendment text so the apply loop below doesn't read each file a second time
+    amd_texts = {}
     for amd_file in amd_files:
         with open(amd_file, 'r', encoding='utf-8') as f:
-            hasher.update(f.read().encode('utf-8'))
+            amd_texts[amd_file] = f.read()
+        hasher.update(amd_texts[amd_file].encode('utf-8'))
     
     current_hash = hasher.hexdigest()
     bill_state = state_manager.get_bill(bill_number)
     amended_path = os.path.join(md_dir, f"{bill_number}_amended.md")
 
     if bill_state.get('amend_input_hash') == current_hash and os.path.exists(amended_path):
-        state_manager.update_bill(bill_number, {
+        return state_manager.update_bill(bill_number, {
             "needs_amend": False,
             "needs_qa": True
         })
-        return
+
+    if not _has_content(bill_content):
+        tqdm.write(f"Skipping amend for {bill_number}: Main MD is empty.")
+        return state_manager.update_bill(bill_number, {"needs_amend": False, "needs_qa": True, "amended_status": "original"})
 
     current_bill_md = bill_content
 
+    # Steps whose (bill text, amendment) input is unchanged are served by the LLM response
+    # cache, so adding an amendment only sends the new steps to the model
     # Apply sequentially
     for amd_file in amd_files:
-        with open(amd_file, 'r', encoding='utf-8') as f:
-            amd_md = f.read()
+        amd_md = amd_texts[amd_file]
+
+        # Empty or near-empty amendments leave the bill unchanged; don't spend an LLM call on them
+        if not _has_content(amd_md, MIN_AMENDMENT_CHARS):
+            tqdm.write(f"Skipping empty amendment {amd_file}")
+            continue
         
         value = USER_TEMPLATE.format(current_bill_md, amd_md)
         
@@ -73,7 +96,8 @@ def apply_amendments(session_year: int, bill_number: str, state_manager, client,
                 value=value,
                 response_format=None,
                 model_name=model_name,
-                model_family=model_family
+                model_family=model_family,
+                use_cache=use_cache
             )
             
             if response_text:
@@ -82,16 +106,15 @@ def apply_amendments(session_year: int, bill_number: str, state_manager, client,
                 raise Exception("LLM returned None")
 
         except Exception as e:
-            print(f"Error applying amendment {amd_file}: {e}")
-            state_manager.update_bill(bill_number, {"amended_status": "failed"})
-            return
+            tqdm.write(f"Error applying amendment {amd_file}: {e}")
+            return state_manager.update_bill(bill_number, {"amended_status": "failed"})
 
     # Save Amended Version
     amended_path = os.path.join(md_dir, f"{bill_number}_amended.md")
     with open(amended_path, 'w', encoding='utf-8') as f:
         f.write(current_bill_md)
 
-    state_manager.update_bill(bill_number, {
+    return state_manager.update_bill(bill_number, {
         "needs_amend": False,
         "needs_qa": True,
         "amended_status": "amended",
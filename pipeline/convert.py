@@ -1,10 +1,15 @@
 import os
+import numpy as np
 import pymupdf
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
-def convert_pdfs_to_md(session_year: int, bill_number: str, state_manager):
+# Bills with at least this many pages are converted across multiple processes
+PARALLEL_PAGE_THRESHOLD = 32
+
+def convert_pdfs_to_md(session_year: int, bill_number: str, state_manager) -> dict:
     """
-    Converts downloaded PDFs for a bill into Markdown.
+    Converts downloaded PDFs for a bill into Markdown. Returns the bill's updated state.
     """
     md_dir = os.path.abspath(f'data/{session_year}rs/md')
     os.makedirs(md_dir, exist_ok=True)
@@ -52,6 +57,8 @@ def convert_pdfs_to_md(session_year: int, bill_number: str, state_manager):
     else:
         state_manager.update_bill(bill_number, {"needs_amend": False, "needs_qa": False})
 
+    return state_manager.get_bill(bill_number)
+
 
 def _convert_single(pdf_path, md_path) -> bool:
     text = pdf_text(pdf_path)
@@ -84,17 +91,18 @@ def pdf_text_simple(pdf_file):
     return "\n\n".join(page_texts)
 
 
-def get_struck_word_rects(page: pymupdf.Page, height_threshold: float = 1.5) -> set[pymupdf.Rect]:
+def get_struck_word_indices(page: pymupdf.Page, height_threshold: float = 1.5, words: Optional[list] = None) -> set[int]:
     """
-    Identifies the bounding boxes of words that intersect with potential
+    Identifies the words that intersect with potential
     strikethrough drawings (thin, black, filled rectangles).
 
     Args:
         page: The pymupdf.Page object to analyze.
         height_threshold: Max height for a drawing rect to be considered a strike line.
+        words: The page's get_text("words") output, if the caller already has it.
 
     Returns:
-        A set containing the pymupdf.Rect objects of words identified as struck through.
+        A set containing the indices (into words) of words identified as struck through.
     """
     strikethrough_line_rects = []
     drawings = page.get_drawings()
@@ -108,31 +116,47 @@ def get_struck_word_rects(page: pymupdf.Page, height_threshold: float = 1.5) ->
                     if 0 < rect.height < height_threshold and rect.width > rect.height * 2: # Check aspect ratio
                         strikethrough_line_rects.append(rect)
 
-    # 2. Get words and their bounding boxes
-    words = page.get_text("words")  # List of (x0, y0, x1, y1, word, ...)
-
-    struck_word_bounding_boxes = set()
-
-    # 3. Check for intersections
-    for word_data in words:
-        word_rect = pymupdf.Rect(word_data[:4])
-        word_text = word_data[4]
+    # Most pages have no strike lines; nothing below can match then
+    if not strikethrough_line_rects:
+        return set()
 
-        if word_rect.is_empty or not word_text.strip():
-            continue
-
-        for strike_rect in strikethrough_line_rects:
-            intersect_rect = word_rect & strike_rect
-            if not intersect_rect.is_empty:
-                 # Check vertical alignment and horizontal overlap
-                 word_v_center = word_rect.y0 + word_rect.height / 2
-                 strike_v_center = strike_rect.y0 + strike_rect.height / 2
-                 if (abs(word_v_center - strike_v_center) < (word_rect.height / 4)) and \
-                    (intersect_rect.width > word_rect.width * 0.5 or intersect_rect.width > 5):
-                     struck_word_bounding_boxes.add(word_rect)
-                     break # Word is struck, no need to check other lines
+    # 2. Get words and their bounding boxes
+    if words is None:
+        words = page.get_text("words")  # List of (x0, y0, x1, y1, word, ...)
 
-    return struck_word_bounding_boxes
+    if not words:
+        return set()
+
+    # 3. Check every word against every strike line at once (words x strikes arrays).
+    # Rect intersection happens in MuPDF's single precision, so overlaps are computed on
+    # float32-rounded coordinates; centers and widths use the full-precision values.
+    W = np.array([w[:4] for w in words], dtype=np.float64)
+    S = np.array([tuple(r) for r in strikethrough_line_rects], dtype=np.float64)
+    W32 = W.astype(np.float32).astype(np.float64)
+    S32 = S.astype(np.float32).astype(np.float64)
+
+    ix0 = np.maximum(W32[:, None, 0], S32[None, :, 0])
+    iy0 = np.maximum(W32[:, None, 1], S32[None, :, 1])
+    ix1 = np.minimum(W32[:, None, 2], S32[None, :, 2])
+    iy1 = np.minimum(W32[:, None, 3], S32[None, :, 3])
+    intersect_width = ix1 - ix0
+    intersects = (intersect_width > 0) & (iy1 - iy0 > 0)
+
+    word_width = W[:, 2] - W[:, 0]
+    word_height = W[:, 3] - W[:, 1]
+    word_v_center = W[:, 1] + word_height / 2
+    strike_v_center = S[:, 1] + (S[:, 3] - S[:, 1]) / 2
+
+    # Check vertical alignment and horizontal overlap
+    aligned = np.abs(word_v_center[:, None] - strike_v_center[None, :]) < (word_height / 4)[:, None]
+    overlaps = (intersect_width > (word_width * 0.5)[:, None]) | (intersect_width > 5)
+    struck = (intersects & aligned & overlaps).any(axis=1)
+
+    # Skip empty boxes and whitespace-only words
+    struck &= (word_width > 0) & (word_height > 0)
+    struck &= np.array([bool(w[4].strip()) for w in words])
+
+    return set(np.flatnonzero(struck).tolist())
 
 def pdf_page_to_markdown(page: pymupdf.Page, include_struck: bool = True) -> str:
     """
@@ -146,12 +170,16 @@ def pdf_page_to_markdown(page: pymupdf.Page, include_struck: bool = True) -> str
     Returns:
         A string containing the Markdown representation of the page.
     """
-    struck_rects = get_struck_word_rects(page)
+    # Extract words once and share them; each get_text call re-parses the page
     words = page.get_text("words") # (x0, y0, x1, y1, word, block_no, line_no, word_no)
+    struck_indices = get_struck_word_indices(page, words=words)
 
     if not words:
         return ""
 
+    # Carry each word's struck flag through the sorting and y0 snapping below
+    words = [(*word_data, i in struck_indices) for i, word_data in enumerate(words)]
+
     # Sort words primarily by vertical position (y0), then horizontal (x0)
     # This helps approximate the reading order
     words.sort(key=lambda w: (w[1], w[0]))
@@ -179,29 +207,30 @@ def pdf_page_to_markdown(page: pymupdf.Page, include_struck: bool = True) -> str
 
 
         # 2. Snap each word's y0 to the nearest estimated row center
+        # Row estimates are ascending, so binary search finds the two candidate rows
+        # for every word at once; ties go to the smaller row, as min() over the list did
+        rows = np.asarray(row_y_estimates)
+        y0s = np.fromiter((w[1] for w in words), dtype=np.float64, count=len(words))
+        idx = np.searchsorted(rows, y0s)
+        below = np.clip(idx - 1, 0, len(rows) - 1)
+        above = np.minimum(idx, len(rows) - 1)
+        nearest = np.where(np.abs(y0s - rows[below]) <= np.abs(y0s - rows[above]), below, above)
+
+        # Keep original y1 for bounding box purposes if needed elsewhere,
+        # but use snapped y0 for sorting and line breaking.
         snapped_words_data = []
-        for word_data in words:
-            original_y0 = word_data[1]
-            # Find the closest row y-coordinate estimate
-            if row_y_estimates:
-                closest_row_y = min(row_y_estimates, key=lambda row_y: abs(original_y0 - row_y))
-                # Create a new list for the word data with the snapped y0
-                # Keep original y1 for bounding box purposes if needed elsewhere,
-                # but use snapped y0 for sorting and line breaking.
-                snapped_data = list(word_data)
-                snapped_data[1] = closest_row_y # Update y0
-                snapped_words_data.append(snapped_data)
-            else:
-                # Should not happen if words list is not empty, but handle defensively
-                 snapped_words_data.append(list(word_data))
-
+        for word_data, closest_row_y in zip(words, rows[nearest].tolist()):
+            snapped_data = list(word_data)
+            snapped_data[1] = closest_row_y # Update y0
+            snapped_words_data.append(snapped_data)
 
         # 3. Resort words based on snapped y0, then original x0
         snapped_words_data.sort(key=lambda w: (w[1], w[0]))
         words = snapped_words_data # Use the list with snapped y0 values
 
     markdown_output = []
-    current_line = ""
+    # Pieces of the current line, joined once at each line break
+    current_line = []
     last_y0 = words[0][1] # Y-coordinate of the first word
     last_x1 = words[0][0] # X-coordinate to track horizontal spacing
 
@@ -210,13 +239,12 @@ def pdf_page_to_markdown(page: pymupdf.Page, include_struck: bool = True) -> str
     line_break_threshold = 10
 
     for i, word_data in enumerate(words):
-        x0, y0, x1, y1, word_text, _, _, _ = word_data
-        word_rect = pymupdf.Rect(x0, y0, x1, y1)
+        x0, y0, x1, y1, word_text, _, _, _, is_struck = word_data
 
         # Check for line break based on vertical distance
         if y0 > last_y0 + line_break_threshold:
-            markdown_output.append(current_line.strip())
-            current_line = ""
+            markdown_output.append("".join(current_line).strip())
+            current_line = []
             # Add extra newline for larger gaps (potential paragraph break)
             if y0 > last_y0 + line_break_threshold * 2:
                  markdown_output.append("") # Add blank line
@@ -224,34 +252,53 @@ def pdf_page_to_markdown(page: pymupdf.Page, include_struck: bool = True) -> str
 
         # Add space if it's not the start of a line and there's a gap
         if current_line and x0 > last_x1 + 2: # Add space if gap > 2 points
-             current_line += " "
-
-        is_struck = word_rect in struck_rects
+             current_line.append(" ")
 
         if is_struck:
             if include_struck:
-                current_line += f"~~{word_text}~~"
+                current_line.append(f"~~{word_text}~~")
             else:
                 # Omit the word - effectively adds nothing to current_line
                 pass
         else:
-            current_line += word_text
+            current_line.append(word_text)
 
         last_y0 = y0
         last_x1 = x1 # Update the end position of the last added word/strikeout
 
         # Handle the last word/line
         if i == len(words) - 1:
-            markdown_output.append(current_line.strip())
+            markdown_output.append("".join(current_line).strip())
 
 
     return "\n".join(markdown_output)
 
 
+def _pages_to_markdown(pdf_file, start, stop):
+    """Worker for pdf_text: converts pages [start, stop). Documents can't be pickled, so each worker reopens the file."""
+    doc = pymupdf.open(pdf_file)
+    return [pdf_page_to_markdown(doc[i]) for i in range(start, stop)]
+
+
 def pdf_text(pdf_file):
-    page_texts = list()
     doc = pymupdf.open(pdf_file) # open a document
-    for index, page in enumerate(doc):
-        page_text = f'START OF PAGE {index + 1}\n{pdf_page_to_markdown(page)}\nEND OF PAGE {index + 1}'
+    page_count = doc.page_count
+    workers = min(os.cpu_count() or 1, page_count)
+
+    # Long bills are split into one contiguous page range per core; short ones aren't worth the process startup
+    if page_count >= PARALLEL_PAGE_THRESHOLD and workers > 1:
+        doc.close()
+        chunk = -(-page_count // workers)
+        starts = list(range(0, page_count, chunk))
+        stops = [min(start + chunk, page_count) for start in starts]
+        with ProcessPoolExecutor(max_workers=len(starts)) as executor:
+            results = executor.map(_pages_to_markdown, [pdf_file] * len(starts), starts, stops)
+            page_markdown = [md for pages in results for md in pages]
+    else:
+        page_markdown = [pdf_page_to_markdown(page) for page in doc]
+
+    page_texts = list()
+    for index, md in enumerate(page_markdown):
+        page_text = f'START OF PAGE {index + 1}\n{md}\nEND OF PAGE {index + 1}'
         page_texts.append(page_text)
     return "\n\n".join(page_texts)
@@ -1,12 +1,33 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import filecmp
 import hashlib
 import json
 from bs4 import BeautifulSoup
 import pandas as pd
 from tqdm import tqdm
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Bill pages and PDFs are fetched concurrently; the work is network-bound
+DOWNLOAD_WORKERS = 16
+# Seconds to wait for the server to connect or send more data
+REQUEST_TIMEOUT = 30
+
+def _build_session(headers) -> requests.Session:
+    """Shared Session so every request to mgaleg reuses pooled keep-alive connections."""
+    session = requests.Session()
+    session.headers.update(headers)
+    retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    # One kept-alive connection per worker; pool_block caps connections to the origin
+    # at the worker count instead of opening (and discarding) overflow connections
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DOWNLOAD_WORKERS, pool_block=True, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 def download_session_data(session_year: int, state_manager) -> List[str]:
     """
@@ -15,9 +36,10 @@ def download_session_data(session_year: int, state_manager) -> List[str]:
     base_url = "https://mgaleg.maryland.gov"
     json_url = f'{base_url}/{session_year}rs/misc/billsmasterlist/legislation.json'
     headers = {'User-Agent': 'Mozilla/5.0 (Custom Pipeline)'}
+    session = _build_session(headers)
 
     print(f"Fetching master list from {json_url}...")
-    resp = requests.get(json_url, headers=headers)
+    resp = session.get(json_url, timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
     leg_data = resp.json()
 
@@ -31,34 +53,34 @@ def download_session_data(session_year: int, state_manager) -> List[str]:
     if session_year != 2026:
         leg_data = [l for l in leg_data if l.get('ChapterNumber')]
 
-    leg_data_map = {l['BillNumber']: l for l in leg_data}
-
-    df = pd.DataFrame.from_records(leg_data)
     # Sort to prioritize HB over SB (Dedup logic)
-    df.sort_values(by='BillNumber', inplace=True)
+    leg_sorted = sorted(leg_data, key=lambda l: l['BillNumber'])
+
+    # Crossfile Dedup: drop a bill when an earlier kept bill in sort order lists it as its crossfile
+    # (a dropped bill's own crossfile is not recorded, so in a chain A -> B -> C, C is kept)
+    bill_rows = []
+    crossfiled = set()
+    for row in leg_sorted:
+        if row['BillNumber'] in crossfiled:
+            continue
+        bill_rows.append(row)
+        if row.get('CrossfileBillNumber'):
+            crossfiled.add(row['CrossfileBillNumber'])
     
-    seen_crossfiles = set()
     bills_to_process = []
 
     pdf_dir = os.path.abspath(f'data/{session_year}rs/pdf')
     os.makedirs(pdf_dir, exist_ok=True)
 
-    for _, row in tqdm(df.iterrows(), total=df.shape[0], desc="Scanning Bill List"):
+    # 1. Decide which bills need scraping (no network work here)
+    to_scrape = {}
+    for row in tqdm(bill_rows, desc="Scanning Bill List", mininterval=1.0):
         bill_number = row['BillNumber']
-        crossfile = row.get('CrossfileBillNumber')
-
-        # Crossfile Dedup
-        if bill_number in seen_crossfiles:
-            continue
-        if crossfile:
-            seen_crossfiles.add(crossfile)
-
         # Check State
         bill_state = state_manager.get_bill(bill_number)
         
         # Calculate Hash
-        raw_bill_data = leg_data_map.get(bill_number, {})
-        data_to_hash = raw_bill_data.copy()
+        data_to_hash = row.copy()
         data_to_hash.pop('StatusCurrentAsOf', None)
         
         # Use consistent JSON serialization for hashing
@@ -71,10 +93,21 @@ def download_session_data(session_year: int, state_manager) -> List[str]:
         
         # We always return the bill to the pipeline, the pipeline decides to run specific stages
         # But we perform the scraping here if 'needs_download' is True or if we want to refresh
-        
         if should_check_html or bill_state.get('needs_download'):
-            # tqdm.write(f"Checking HTML for {bill_number}...") # Optional: log if needed without breaking bar
-            files_downloaded = scrape_and_download(session_year, bill_number, pdf_dir, headers)
+            to_scrape[bill_number] = (current_hash, should_check_html)
+        
+        bills_to_process.append(bill_number)
+
+    # 2. Scrape bill pages and download PDFs concurrently; state is only touched from this thread
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(scrape_and_download, session_year, bill_number, pdf_dir, session): bill_number
+            for bill_number in to_scrape
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading Bills", mininterval=1.0):
+            bill_number = futures[future]
+            current_hash, should_check_html = to_scrape[bill_number]
+            files_downloaded = future.result()
             
             # If check was successful (returned dict, even if empty)
             if files_downloaded is not None:
@@ -95,62 +128,63 @@ def download_session_data(session_year: int, state_manager) -> List[str]:
                     state_manager.mark_dirty(bill_number, 'convert')
                 
                 state_manager.update_bill(bill_number, updates)
-        
-        bills_to_process.append(bill_number)
 
     return bills_to_process
 
-def scrape_and_download(session_year, bill_number, output_dir, headers) -> Optional[Dict[str, str]]:
+def scrape_and_download(session_year, bill_number, output_dir, session) -> Optional[Dict[str, str]]:
     """Scrapes the specific bill page and downloads PDFs. Returns dict of file paths or None on failure."""
     url = f'https://mgaleg.maryland.gov/mgawebsite/Legislation/Details/{bill_number}?ys={session_year}rs'
     try:
-        r = requests.get(url, headers=headers)
+        r = session.get(url, timeout=REQUEST_TIMEOUT)
         r.raise_for_status()
     except Exception as e:
-        print(f"Failed to fetch {url}: {e}")
+        tqdm.write(f"Failed to fetch {url}: {e}")
         return None
 
-    soup = BeautifulSoup(r.content, 'html.parser')
+    soup = BeautifulSoup(r.content, 'lxml')
     downloaded_files = {}
 
     # 1. Fiscal and Policy Note
     # We search globally for the URL prefix as requested
-    fn_prefix = f'/{session_year}RS/fnotes/'
-    fn_link = None
-    for anchor in soup.find_all('a', href=True):
-        if anchor['href'].startswith(fn_prefix):
-            fn_link = anchor['href']
-            break  # Take the first matching one
+    # (select_one stops at the first matching anchor)
+    fn_anchor = soup.select_one(f'a[href^="/{session_year}RS/fnotes/"]')
+    fn_link = fn_anchor['href'] if fn_anchor else None
     
     if fn_link:
         fn_path = os.path.join(output_dir, f"{bill_number}_fn.pdf")
         try:
-            _download_file(f"https://mgaleg.maryland.gov{fn_link}", fn_path, headers)
+            _download_file(f"https://mgaleg.maryland.gov{fn_link}", fn_path, session)
             if os.path.exists(fn_path):
                 downloaded_files['fiscal_note'] = fn_path
         except Exception as e:
-            print(f"Error downloading fiscal note for {bill_number}: {e}")
+            tqdm.write(f"Error downloading fiscal note for {bill_number}: {e}")
             # Decide if fiscal note failure is critical. Usually yes if it's there.
             return None
 
     # 2. Main Bill PDF & Amendments
     # Look for the second table usually containing bill text links
-    tables = soup.find_all('table')
+    # (limit stops the search once it is found)
+    tables = soup.find_all('table', limit=2)
     bill_link = None
     amendments = {}
 
+    bill_prefixes = (f'/{session_year}RS/bills/', f'/{session_year}RS/Chapters')
+    amd_prefix = f'/{session_year}RS/amds/'
+
     if len(tables) > 1:
         target = tables[1]
         for anchor in target.find_all('a', href=True):
             href = anchor['href']
             # Find Bill Text
-            if href.startswith(f'/{session_year}RS/bills/') or href.startswith(f'/{session_year}RS/Chapters'):
+            if href.startswith(bill_prefixes):
                 bill_link = href
                 amendments = {} # Reset if we find a newer bill version
             
             # Find Adopted Amendments
-            elif href.startswith(f'/{session_year}RS/amds/'):
-                if bill_link and 'Adopted' in anchor.parent.text and 'Withdrawn' not in anchor.parent.text:
+            elif href.startswith(amd_prefix) and bill_link:
+                # Walk the parent's subtree once for both status checks
+                parent_text = anchor.parent.get_text()
+                if 'Adopted' in parent_text and 'Withdrawn' not in parent_text:
                     amd_id = anchor.text.replace("/", "_").strip()
                     amendments[amd_id] = href
 
@@ -159,7 +193,7 @@ def scrape_and_download(session_year, bill_number, output_dir, headers) -> Optio
         if bill_link:
             fname = f"{bill_number}.pdf"
             fpath = os.path.join(output_dir, fname)
-            _download_file(f"https://mgaleg.maryland.gov{bill_link}", fpath, headers)
+            _download_file(f"https://mgaleg.maryland.gov{bill_link}", fpath, session)
             if os.path.exists(fpath):
                 downloaded_files['bill_pdf'] = fpath
 
@@ -168,30 +202,37 @@ def scrape_and_download(session_year, bill_number, output_dir, headers) -> Optio
         for amd_id, amd_href in amendments.items():
             fname = f"{bill_number}_amd{amd_id}.pdf"
             fpath = os.path.join(output_dir, fname)
-            _download_file(f"https://mgaleg.maryland.gov{amd_href}", fpath, headers)
+            _download_file(f"https://mgaleg.maryland.gov{amd_href}", fpath, session)
             if os.path.exists(fpath):
                  downloaded_files['amendments'].append(fpath)
     except Exception as e:
-        print(f"Error downloading files for {bill_number}: {e}")
+        tqdm.write(f"Error downloading files for {bill_number}: {e}")
         return None
 
     return downloaded_files
 
-def _download_file(url, path, headers) -> bool:
+def _download_file(url, path, session) -> bool:
     """
+    Streams the file to disk in chunks rather than holding it in memory.
     Returns True if file was downloaded (new/changed), False if existed.
     Raises Exception on failure.
     """
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    new_content = r.content
-    
-    if os.path.exists(path):
-        with open(path, 'rb') as f:
-            old_content = f.read()
-        if old_content == new_content:
-            return False # Content didn't change
-            
-    with open(path, 'wb') as f:
-        f.write(new_content)
-    return True
\ No newline at end of file
+    part_path = path + '.part'
+    try:
+        with session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as r:
+            r.raise_for_status()
+            with open(part_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    f.write(chunk)
+    except BaseException:
+        # Don't leave a truncated partial download behind
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    if os.path.exists(path) and filecmp.cmp(part_path, path, shallow=False):
+        os.remove(part_path)
+        return False # Content didn't change
+
+    os.replace(part_path, path)
+    return True
@@ -2,28 +2,44 @@ import os
 import pandas as pd
 import json
 import hashlib
+import copy
 from pydantic import BaseModel, Field
 from typing import Optional, List, Literal
 from llm_utils import query_llm_with_retries
 import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
 
 _legislation_json_cache = {}
 
 def get_bill_json_info(session_year, bill_number):
     """Retrieves bill info from the master legislation.json file, with caching."""
-    if session_year not in _legislation_json_cache:
-        json_path = os.path.abspath(f'data/{session_year}rs/legislation.json')
-        if os.path.exists(json_path):
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    _legislation_json_cache[session_year] = {b['BillNumber']: b for b in data}
-            except Exception as e:
-                print(f"Error loading {json_path}: {e}")
-                _legislation_json_cache[session_year] = {}
-        else:
-            _legislation_json_cache[session_year] = {}
-    return _legislation_json_cache[session_year].get(bill_number)
+    json_path = os.path.abspath(f'data/{session_year}rs/legislation.json')
+    try:
+        mtime = os.path.getmtime(json_path)
+    except OSError:
+        return None
+
+    # The download stage rewrites legislation.json, so reload when the file changes
+    cached = _legislation_json_cache.get(session_year)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            index = {b['BillNumber']: b for b in data}
+        except Exception as e:
+            tqdm.write(f"Error loading {json_path}: {e}")
+            index = {}
+        cached = (mtime, index)
+        _legislation_json_cache[session_year] = cached
+    return cached[1].get(bill_number)
+
+# Cap on generated tokens for the general QA call (includes model thinking tokens on Gemini).
+# The agency relevance list can run to several thousand tokens on its own, so that call is uncapped.
+QA_MAX_OUTPUT_TOKENS = 8192
+
+# Number of QA requests in flight at once (each bill makes two)
+QA_CONCURRENCY = 16
 
 # Load agencies for validation
 agencies_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'maryland_agencies.csv')
@@ -91,18 +107,31 @@ def load_agencies(csv_path):
                 agencies.append(f"Agency: {row.get('Agency Name', 'Unknown')}\nSummary: {row.get('Summary', 'N/A')}")
     return "\n---\n".join(agencies)
 
+# The agency list is the same for every bill, so the prompt is built once at import
+AGENCIES_TEXT = load_agencies(agencies_path)
+AGENCY_PROMPT = get_agency_prompt(AGENCIES_TEXT) if AGENCIES_TEXT else None
 
 
-def run_qa(session_year: int, bill_number: str, state_manager, client, model_name, model_family):
+def build_qa_input(session_year: int, bill_number: str, md_files: Optional[set] = None) -> str:
+    """
+    Assembles the QA input: bill text (amended if available, else legislation.json info) plus the fiscal note.
+    md_files: names in the md directory, listed once by callers handling many bills (else each file is stat'ed)
+    """
     md_dir = os.path.abspath(f'data/{session_year}rs/md')
+
+    def md_exists(name):
+        if md_files is not None:
+            return name in md_files
+        return os.path.exists(os.path.join(md_dir, name))
     
     # Prefer amended text, fall back to original
-    bill_path = os.path.join(md_dir, f"{bill_number}_amended.md")
-    if not os.path.exists(bill_path):
-        bill_path = os.path.join(md_dir, f"{bill_number}.md")
+    bill_name = f"{bill_number}_amended.md"
+    if not md_exists(bill_name):
+        bill_name = f"{bill_number}.md"
+    bill_path = os.path.join(md_dir, bill_name)
     
     bill_md = ""
-    if os.path.exists(bill_path):
+    if md_exists(bill_name):
         with open(bill_path, 'r', encoding='utf-8') as f:
             bill_md = f.read()
     else:
@@ -128,7 +157,7 @@ def run_qa(session_year: int, bill_number: str, state_manager, client, model_nam
 
     # Load Fiscal Note if available (always try to append it)
     fn_path = os.path.join(md_dir, f"{bill_number}_fn.md")
-    if os.path.exists(fn_path):
+    if md_exists(f"{bill_number}_fn.md"):
         with open(fn_path, 'r', encoding='utf-8') as f:
             fn_md = f.read()
         if bill_md:
@@ -136,60 +165,171 @@ def run_qa(session_year: int, bill_number: str, state_manager, client, model_nam
         else:
             bill_md = f"FISCAL NOTE:\n{fn_md}"
 
+    return bill_md
+
+
+def qa_input_hash(bill_md: str) -> str:
+    return hashlib.sha256(bill_md.encode('utf-8')).hexdigest()
+
+
+def _query_answers(bill_md, client, model_name, model_family, use_cache=True):
+    return query_llm_with_retries(
+        client=client,
+        prompt=SYSTEM_PROMPT,
+        value=bill_md,
+        response_format=AnswersToQuestions,
+        model_name=model_name,
+        max_retries=3,
+        model_family=model_family,
+        max_output_tokens=QA_MAX_OUTPUT_TOKENS,
+        use_cache=use_cache
+    )
+
+
+def _query_agency_relevance(bill_md, client, model_name, model_family, use_cache=True):
+    if not AGENCY_PROMPT:
+        return None
+    return query_llm_with_retries(
+        client=client,
+        prompt=AGENCY_PROMPT,
+        value=bill_md,
+        response_format=AgencyAnalysis,
+        model_name=model_name,
+        max_retries=3,
+        model_family=model_family,
+        use_cache=use_cache
+    )
+
+
+def _qa_is_current(state_manager, bill_number, current_hash) -> bool:
+    bill_state = state_manager.get_bill(bill_number)
+    return bool(bill_state.get('qa_input_hash') == current_hash and bill_state.get('qa_results'))
+
+
+def _save_qa_results(state_manager, bill_number, response, agency_response, current_hash):
+    qa_data = {}
+    if response:
+        qa_data = response
+
+    if agency_response:
+        # Store as a list of dicts
+        qa_data['agency_relevance'] = agency_response.get('relevant_agencies', [])
+
+    if not qa_data:
+        return
+
+    # Only mark QA done once every call succeeded; otherwise keep what we got and retry next run
+    complete = response is not None and (agency_response is not None or not AGENCY_PROMPT)
+    if not complete:
+        tqdm.write(f"Incomplete QA for {bill_number}; will retry next run")
+        state_manager.update_bill(bill_number, {"qa_results": qa_data})
+        return
+
+    state_manager.update_bill(bill_number, {
+        "qa_results": qa_data,
+        "needs_qa": False,
+        "qa_input_hash": current_hash
+    })
+
+
+def run_qa(session_year: int, bill_number: str, state_manager, client, model_name, model_family, bill_md: Optional[str] = None, use_cache: bool = True):
+    if bill_md is None:
+        bill_md = build_qa_input(session_year, bill_number)
+
     if not bill_md:
-        print(f"No text, JSON info, or Fiscal Note available for QA: {bill_number}")
+        tqdm.write(f"No text, JSON info, or Fiscal Note available for QA: {bill_number}")
         return
 
     # Check hash to see if input changed
-    current_hash = hashlib.sha256(bill_md.encode('utf-8')).hexdigest()
-    bill_state = state_manager.get_bill(bill_number)
-    
-    if bill_state.get('qa_input_hash') == current_hash and bill_state.get('qa_results'):
+    current_hash = qa_input_hash(bill_md)
+    if _qa_is_current(state_manager, bill_number, current_hash):
         state_manager.update_bill(bill_number, {"needs_qa": False})
         return
 
     try:
         # 1. General QA
-        response = query_llm_with_retries(
-            client=client,
-            prompt=SYSTEM_PROMPT,
-            value=bill_md,
-            response_format=AnswersToQuestions,
-            model_name=model_name,
-            max_retries=3,
-            model_family=model_family
-        )
-        
-        qa_data = {}
-        if response:
-            qa_data = response
+        response = _query_answers(bill_md, client, model_name, model_family, use_cache)
         
         # 2. Agency Relevance Analysis
-        agencies_csv = os.path.abspath('data/maryland_agencies.csv')
-        agencies_text = load_agencies(agencies_csv)
-        
-        if agencies_text:
-            agency_prompt = get_agency_prompt(agencies_text)
-            agency_response = query_llm_with_retries(
-                client=client,
-                prompt=agency_prompt,
-                value=bill_md,
-                response_format=AgencyAnalysis,
-                model_name=model_name,
-                max_retries=3,
-                model_family=model_family
-            )
-            
-            if agency_response:
-                # Store as a list of dicts
-                qa_data['agency_relevance'] = agency_response.get('relevant_agencies', [])
-
-        if qa_data:
-            state_manager.update_bill(bill_number, {
-                "qa_results": qa_data,
-                "needs_qa": False,
-                "qa_input_hash": current_hash
-            })
+        agency_response = _query_agency_relevance(bill_md, client, model_name, model_family, use_cache)
+
+        _save_qa_results(state_manager, bill_number, response, agency_response, current_hash)
             
     except Exception as e:
-        print(f"QA Failed for {bill_number}: {e}")
+        tqdm.write(f"QA Failed for {bill_number}: {e}")
+
+
+def run_qa_batch(session_year: int, bill_numbers: List[str], state_manager, client, model_name, model_family, concurrency: int = QA_CONCURRENCY, use_cache: bool = True):
+    """
+    Runs QA for many bills concurrently. Both LLM calls of every bill go to one thread pool,
+    and bills with identical QA input are queried once and share the answer.
+    """
+    # One directory listing instead of several existence checks per bill
+    md_dir = os.path.abspath(f'data/{session_year}rs/md')
+    md_files = set(os.listdir(md_dir)) if os.path.isdir(md_dir) else set()
+
+    qa_groups = {}
+    qa_inputs = {}
+    for bill_number in bill_numbers:
+        bill_md = build_qa_input(session_year, bill_number, md_files)
+        key = qa_input_hash(bill_md) if bill_md else bill_number
+        if key not in qa_groups:
+            qa_groups[key] = []
+            qa_inputs[key] = bill_md
+        qa_groups[key].append(bill_number)
+
+    # Calls are network-bound, so keep several in flight; state is only updated from this thread
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for key, bills in qa_groups.items():
+            representative, *duplicates = bills
+            bill_md = qa_inputs[key]
+
+            if not bill_md:
+                tqdm.write(f"No text, JSON info, or Fiscal Note available for QA: {representative}")
+                continue
+
+            if _qa_is_current(state_manager, representative, key):
+                state_manager.update_bill(representative, {"needs_qa": False})
+                if duplicates:
+                    share_qa_results(state_manager, representative, duplicates)
+                continue
+
+            futures[key] = (
+                executor.submit(_query_answers, bill_md, client, model_name, model_family, use_cache),
+                executor.submit(_query_agency_relevance, bill_md, client, model_name, model_family, use_cache),
+            )
+
+        future_keys = {future: key for key, pair in futures.items() for future in pair}
+        remaining = {key: len(pair) for key, pair in futures.items()}
+        for future in tqdm(as_completed(future_keys), total=len(future_keys), desc="Running QA", mininterval=1.0):
+            key = future_keys[future]
+            remaining[key] -= 1
+            if remaining[key]:
+                continue
+
+            # Both calls for this input are done
+            representative, *duplicates = qa_groups[key]
+            answers_future, agencies_future = futures[key]
+            try:
+                _save_qa_results(state_manager, representative, answers_future.result(), agencies_future.result(), key)
+            except Exception as e:
+                tqdm.write(f"QA Failed for {representative}: {e}")
+                continue
+
+            if duplicates:
+                share_qa_results(state_manager, representative, duplicates)
+
+
+def share_qa_results(state_manager, source_bill: str, bill_numbers: List[str]):
+    """Copies QA results from source_bill to bills whose QA input is identical to it."""
+    source = state_manager.get_bill(source_bill)
+    if source.get('needs_qa') or not source.get('qa_results'):
+        # QA failed for the source; the duplicates stay dirty and are retried next run
+        return
+    for bill_number in bill_numbers:
+        state_manager.update_bill(bill_number, {
+            "qa_results": copy.deepcopy(source['qa_results']),
+            "needs_qa": False,
+            "qa_input_hash": source['qa_input_hash']
+        })
@@ -1,15 +1,26 @@
 import json
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, Optional, Literal
 
 STATE_FILE = "pipeline_state.json"
+# Bill updates buffered in memory before the state file is rewritten
+SAVE_EVERY = 50
 
 class PipelineState:
     def __init__(self, session_year: int):
         self.session_year = session_year
         self.state_path = os.path.join(f"data/{session_year}rs", STATE_FILE)
         self.data = self._load_state()
+        # Stages collect worker results and update state on the main thread; the lock
+        # guards callers that drive single bills (e.g. run_qa) from their own threads
+        self._lock = threading.RLock()
+        self._pending = 0
+        # Open transaction() blocks and the timestamp shared by their updates
+        self._tx_depth = 0
+        self._tx_now = None
 
     def _load_state(self) -> Dict:
         if os.path.exists(self.state_path):
@@ -18,11 +29,46 @@ class PipelineState:
         return {}
 
     def save(self):
-        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
-        with open(self.state_path, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            # Write to a temp file and swap it in so a crash mid-write can't truncate the state
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+            self._pending = 0
+
+    def flush(self):
+        """Writes any buffered updates to disk."""
+        with self._lock:
+            if self._pending:
+                self.save()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups several updates (e.g. every stage of one bill): they share one timestamp,
+        and the batched save is only considered once the outermost block exits.
+        """
+        with self._lock:
+            if not self._tx_depth:
+                self._tx_now = datetime.now().isoformat()
+            self._tx_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._tx_depth -= 1
+                if not self._tx_depth:
+                    self._tx_now = None
+                    if self._pending >= SAVE_EVERY:
+                        self.save()
 
     def get_bill(self, bill_number: str) -> Dict:
+        with self._lock:
+            return self._get_bill(bill_number)
+
+    def _get_bill(self, bill_number: str) -> Dict:
         if bill_number not in self.data:
             now = datetime.now().isoformat()
             self.data[bill_number] = {
@@ -49,16 +95,21 @@ class PipelineState:
                 
         return self.data[bill_number]
 
-    def update_bill(self, bill_number: str, updates: Dict):
-        bill = self.get_bill(bill_number)
-        # Recursive update or simple merge
-        for k, v in updates.items():
-            if isinstance(v, dict) and k in bill and isinstance(bill[k], dict):
-                bill[k].update(v)
-            else:
-                bill[k] = v
-        self.data[bill_number]["last_updated_local"] = datetime.now().isoformat()
-        self.save()
+    def update_bill(self, bill_number: str, updates: Dict) -> Dict:
+        with self._lock:
+            bill = self._get_bill(bill_number)
+            # Recursive update or simple merge
+            for k, v in updates.items():
+                if isinstance(v, dict) and k in bill and isinstance(bill[k], dict):
+                    bill[k].update(v)
+                else:
+                    bill[k] = v
+            self.data[bill_number]["last_updated_local"] = self._tx_now or datetime.now().isoformat()
+            # Rewriting the whole file per update is quadratic over a session; save in batches
+            self._pending += 1
+            if self._pending >= SAVE_EVERY and not self._tx_depth:
+                self.save()
+            return bill
 
     def mark_dirty(self, bill_number: str, stage: Literal['download', 'convert', 'amend', 'qa']):
         """Cascading dirty marker"""
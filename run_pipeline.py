@@ -1,9 +1,11 @@
 import os
 import argparse
+import functools
 import json
 from tqdm import tqdm
 from dotenv import load_dotenv
 from google import genai
+from google.genai import types
 from openai import OpenAI
 import ollama
 
@@ -12,21 +14,30 @@ from pipeline.state import PipelineState
 from pipeline.download import download_session_data
 from pipeline.convert import convert_pdfs_to_md
 from pipeline.amend import apply_amendments
-from pipeline.qa import run_qa
+from pipeline.qa import run_qa_batch
 
+# Load environment variables once (Expects GEMINI_API_KEY or OPENAI_API_KEY)
+load_dotenv()
+
+# Per-request timeout for LLM calls. Amend regenerates whole bills, so this is generous;
+# it exists so a hung connection fails into query_llm_with_retries instead of stalling the run.
+LLM_TIMEOUT_SECONDS = 300
+
+@functools.lru_cache(maxsize=None)
 def setup_client(family, model_name):
-    load_dotenv()
+    """Builds the LLM client for a model family; repeated calls return the same client."""
     if family == 'gemini':
         key = os.getenv("GEMINI_API_KEY")
         if not key: raise ValueError("Missing GEMINI_API_KEY")
-        return genai.Client(api_key=key)
+        return genai.Client(api_key=key, http_options=types.HttpOptions(timeout=LLM_TIMEOUT_SECONDS * 1000))
     elif family == 'gpt':
         key = os.getenv("OPENAI_API_KEY")
         if not key: raise ValueError("Missing OPENAI_API_KEY")
-        return OpenAI(api_key=key)
+        # Retries are handled by query_llm_with_retries
+        return OpenAI(api_key=key, timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
     else:
         ollama.pull(model_name)
-        return ollama.chat
+        return ollama.Client(timeout=LLM_TIMEOUT_SECONDS).chat
 
 def main():
     parser = argparse.ArgumentParser(description='Maryland Legislation Pipeline')
@@ -34,6 +45,7 @@ def main():
     parser.add_argument('--model-family', default='gemini', choices=['gemini', 'gpt', 'ollama'])
     parser.add_argument('--model', default='gemini-3-flash-preview', help='Model Name')
     parser.add_argument('--debug', action='store_true', help='Limit processing to first 10 bills')
+    parser.add_argument('--no-llm-cache', action='store_true', help='Ignore cached LLM responses and query the model again')
     args = parser.parse_args()
 
     print(f"--- Starting Pipeline for {args.year} ---")
@@ -44,36 +56,44 @@ def main():
     # 2. Initialize LLM Client (used for Amend and QA)
     client = setup_client(args.model_family, args.model)
 
-    # 3. Download Stage
-    # This returns all bills, but updates state for new ones
-    all_bills = download_session_data(args.year, state)
+    # State is saved in batches; make sure every update reaches disk even if a stage fails
+    try:
+        # 3. Download Stage
+        # This returns all bills, but updates state for new ones
+        all_bills = download_session_data(args.year, state)
     
-    if args.debug:
-        print("Debug mode: Limiting processing to first 10 bills.")
-        all_bills = all_bills[:10]
+        if args.debug:
+            print("Debug mode: Limiting processing to first 10 bills.")
+            all_bills = all_bills[:10]
     
-    # 4. Process Loop
-    # We iterate through all known bills and check their 'needs_*' flags
-    for bill_number in tqdm(all_bills, desc="Processing Bills"):
-        bill_data = state.get_bill(bill_number)
-
-        # Convert Stage
-        if bill_data.get('needs_convert'):
-            convert_pdfs_to_md(args.year, bill_number, state)
-            # Refresh state
+        # 4. Process Loop
+        # We iterate through all known bills and check their 'needs_*' flags
+        qa_bills = []
+        for bill_number in tqdm(all_bills, desc="Processing Bills", mininterval=1.0):
             bill_data = state.get_bill(bill_number)
 
-        # Amend Stage
-        if bill_data.get('needs_amend'):
-            apply_amendments(args.year, bill_number, state, client, args.model, args.model_family)
-            bill_data = state.get_bill(bill_number)
+            # One transaction per bill: its stage updates share a timestamp and a save check
+            with state.transaction():
+                # Convert Stage
+                # Each stage returns the bill's updated state
+                if bill_data.get('needs_convert'):
+                    bill_data = convert_pdfs_to_md(args.year, bill_number, state)
 
-        # QA Stage
-        if bill_data.get('needs_qa'):
-            run_qa(args.year, bill_number, state, client, args.model, args.model_family)
+                # Amend Stage
+                if bill_data.get('needs_amend'):
+                    bill_data = apply_amendments(args.year, bill_number, state, client, args.model, args.model_family, use_cache=not args.no_llm_cache)
 
-    # 5. Final Export
-    export_frontend_data(args.year, state)
+            # QA is collected here and run concurrently below
+            if bill_data.get('needs_qa'):
+                qa_bills.append(bill_number)
+
+        # 5. QA Stage
+        run_qa_batch(args.year, qa_bills, state, client, args.model, args.model_family, use_cache=not args.no_llm_cache)
+
+        # 6. Final Export
+        export_frontend_data(args.year, state)
+    finally:
+        state.flush()
     print("--- Pipeline Complete ---")
 
 def export_frontend_data(session_year, state_manager):
@@ -88,8 +108,7 @@ def export_frontend_data(session_year, state_manager):
     with open(leg_path, 'r', encoding='utf-8') as f:
         legislation_list = json.load(f)
 
-    # 2. Combine with QA results from state
-    combined_data = []
+    # 2. Combine with QA results from state (bills are updated in place)
     for bill in legislation_list:
         bill_number = bill.get('BillNumber')
         bill_state = state_manager.get_bill(bill_number)
@@ -106,14 +125,13 @@ def export_frontend_data(session_year, state_manager):
         qa_results = bill_state.get('qa_results')
         if qa_results:
             bill.update(qa_results)
-        
-        combined_data.append(bill)
 
     # 3. Save to frontend_data.json
+    # json.dump encodes incrementally, so the output is never built as one string
     out_path = os.path.join(f"data/{session_year}rs", "frontend_data.json")
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(combined_data, f, indent=2)
+        json.dump(legislation_list, f, indent=2)
     
     print(f"Frontend data exported to {out_path}")
 